@@ -91,6 +91,14 @@ elif [[ -n "${CONNECT_TOPIC2TABLE:-}" && "${CONNECT_TOPIC2TABLE}" == *"="* ]]; t
 fi
 TABLE="${TABLE:-production_test_table_1}"
 
+# Several pairs in one run: VALIDATION_TOPIC_TABLE_MAP="topic1=table1,topic2=table2"
+# (same syntax as CONNECT_TOPIC2TABLE); overrides the single topic/table above
+if [[ -n "${VALIDATION_TOPIC_TABLE_MAP:-}" ]]; then
+  PAIR_ARGS=(--topic-table-map "${VALIDATION_TOPIC_TABLE_MAP}")
+else
+  PAIR_ARGS=(--topic "${TOPIC}" --table "${TABLE}")
+fi
+
 # Batch + flags
 BATCH_SIZE="${VALIDATION_BATCH_SIZE:-10000}"
 COMMIT_FLAG=()
@@ -98,6 +106,22 @@ case "${VALIDATION_COMMIT:-0}" in
   1|true|TRUE|yes|YES) COMMIT_FLAG=(--commit) ;;
 esac
 
+# Payload format: json (default) | msgpack | avro
+PAYLOAD_FORMAT="${VALIDATION_PAYLOAD_FORMAT:-json}"
+FORMAT_ARGS=(--payload-format "${PAYLOAD_FORMAT}")
+[[ -n "${VALIDATION_AVRO_SCHEMA:-}" ]] && FORMAT_ARGS+=(--avro-schema "${VALIDATION_AVRO_SCHEMA}")
+[[ -n "${VALIDATION_SCHEMA_DIR:-}"  ]] && FORMAT_ARGS+=(--schema-dir "${VALIDATION_SCHEMA_DIR}")
+
+# Repair: backfill rows missing in ClickHouse after validating
+REPAIR_ARGS=()
+case "${VALIDATION_REPAIR:-0}" in
+  1|true|TRUE|yes|YES)
+    REPAIR_ARGS=(--repair
+      --repair-block-size "${VALIDATION_REPAIR_BLOCK_SIZE:-200000}"
+      --repair-partition "${VALIDATION_REPAIR_PARTITION:-auto}"
+      --repair-log "${VALIDATION_REPAIR_LOG:-repair_blocks.json}") ;;
+esac
+
 # --- ensure venv ---
 # Use --use-lock if you want exact versions from requirements.lock
 USE_LOCK="${VALIDATION_USE_LOCK:-0}"
@@ -122,7 +146,7 @@ CH_QUERY_LOG="${VALIDATION_CH_QUERY_LOG:-ch_query_windows.json}"
 # --- run ---
 exec "${PY}" "${PY_FILE}" \
   --broker "${BROKER}" \
-  --topic "${TOPIC}" \
+  "${PAIR_ARGS[@]}" \
   --start-time "${START_TIME}" \
   --batch-size "${BATCH_SIZE}" \
   --ch-host "${CH_HOST}" \
@@ -130,9 +154,10 @@ exec "${PY}" "${PY_FILE}" \
   --ch-user "${CH_USER}" \
   --ch-password "${CH_PASSWORD}" \
   --ch-database "${CH_DB}" \
-  --table "${TABLE}" \
   --summary "${SUMMARY}" \
   --details "${DETAILS}" \
   --bad-rows "${BAD_ROWS}" \
   --ch-query-log "${CH_QUERY_LOG}" \
+  "${FORMAT_ARGS[@]}" \
+  "${REPAIR_ARGS[@]}" \
   "${COMMIT_FLAG[@]}"
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# bench_payload_decode.py — compare decode throughput of the validator payload formats
+#
+# Encodes the same synthetic trade rows as JSON, msgpack (array + map) and Avro
+# (schemaless + registry-framed), then times each payload_formats decoder
+# turning bytes into the 7-field key. No Kafka or ClickHouse needed.
+#
+#   python3 bench_payload_decode.py --rows 200000 --repeat 5 --output bench.json
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from payload_formats import (
+    KEY_FIELDS, AvroRecordDecoder, LocalSchemaRegistry, decode_json, decode_msgpack,
+    load_avro_schema, msgpack,
+)
+
+DEFAULT_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "configs", "schemas", "trade_event.avsc")
+
+# ---------- Synthetic rows + encoders ----------
+
+def make_rows(n: int, seed: int = 42) -> List[Tuple]:
+    rnd = random.Random(seed)
+    tickers = ["AAPL", "MSFT", "NVDA", "SPY", "QQQ", "TSLA", "AMZN", "META"]
+    exchanges = ["Q", "N", "P", "Z", "K", "D"]
+    t0 = 1_735_790_340_000_000_000
+    return [
+        (
+            t0 + i * 1_000 + rnd.randrange(1_000),
+            rnd.choice(("T", "Q")),
+            rnd.choice(tickers),
+            rnd.randrange(1_000_000, 60_000_000),
+            rnd.randrange(1, 5_000),
+            rnd.choice(exchanges),
+            rnd.choice(("@", "@ F", "@ T I", "")),
+        )
+        for i in range(n)
+    ]
+
+def _avro_long(n: int) -> bytes:
+    n = (n << 1) ^ (n >> 63)
+    out = bytearray()
+    while n & ~0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def _avro_string(s: str) -> bytes:
+    b = s.encode("utf-8")
+    return _avro_long(len(b)) + b
+
+def encode_avro(row: Tuple) -> bytes:
+    # field order matches configs/schemas/trade_event.avsc
+    enc = (_avro_long, _avro_string, _avro_string, _avro_long, _avro_long, _avro_string, _avro_string)
+    return b"".join(f(v) for f, v in zip(enc, row))
+
+# ---------- Timing ----------
+
+def time_decoder(decode: Callable[[bytes], Tuple], payloads: List[bytes], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in payloads:
+            decode(p)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark validator payload decoders (bytes → 7-field key).")
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--repeat", type=int, default=5, help="Best-of-N timing per format")
+    ap.add_argument("--avro-schema", default=DEFAULT_SCHEMA)
+    ap.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = ap.parse_args()
+
+    rows = make_rows(args.rows)
+    avro_dec = AvroRecordDecoder(load_avro_schema(args.avro_schema))
+
+    cases: Dict[str, Tuple[Callable, List[bytes]]] = {
+        "json": (decode_json, [json.dumps(dict(zip(KEY_FIELDS, r))).encode("utf-8") for r in rows]),
+        "avro": (avro_dec.decode, [encode_avro(r) for r in rows]),
+    }
+
+    # registry stand-in with the schema as id 1; loaded up front so the
+    # temporary directory can go away before timing starts
+    with tempfile.TemporaryDirectory(prefix="bench-schemas-") as schema_dir:
+        with open(os.path.join(schema_dir, "1.avsc"), "w") as f, open(args.avro_schema) as src:
+            f.write(src.read())
+        registry = LocalSchemaRegistry(schema_dir)
+        registry.decoder_for(1)
+    framed_prefix = b"\x00" + (1).to_bytes(4, "big")
+    cases["avro_registry"] = (registry.decode, [framed_prefix + p for p in cases["avro"][1]])
+
+    if msgpack is not None:
+        cases["msgpack_array"] = (decode_msgpack, [msgpack.packb(list(r)) for r in rows])
+        cases["msgpack_map"] = (decode_msgpack, [msgpack.packb(dict(zip(KEY_FIELDS, r))) for r in rows])
+    else:
+        print("[Bench] msgpack not installed; skipping msgpack formats", file=sys.stderr)
+
+    # sanity: every format must decode to the same keys
+    for name, (decode, payloads) in cases.items():
+        if [decode(p) for p in payloads[:1000]] != rows[:1000]:
+            raise RuntimeError(f"Decoder '{name}' does not round-trip the sample rows")
+
+    results = []
+    for name, (decode, payloads) in cases.items():
+        secs = time_decoder(decode, payloads, args.repeat)
+        results.append({
+            "format": name,
+            "rows": len(payloads),
+            "avg_payload_bytes": round(sum(len(p) for p in payloads) / len(payloads), 1),
+            "seconds": round(secs, 4),
+            "rows_per_sec": round(len(payloads) / secs),
+        })
+
+    base = next(r["rows_per_sec"] for r in results if r["format"] == "json")
+    print(f"\n===== Decode benchmark ({args.rows} rows, best of {args.repeat}) =====")
+    print(f"{'format':<15}{'bytes/row':>10}{'rows/s':>14}{'vs json':>9}")
+    for r in results:
+        r["speedup_vs_json"] = round(r["rows_per_sec"] / base, 2)
+        print(f"{r['format']:<15}{r['avg_payload_bytes']:>10}{r['rows_per_sec']:>14,}{r['speedup_vs_json']:>8}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
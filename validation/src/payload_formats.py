@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# payload_formats.py — Kafka payload decoders for validate_batched.py
+#
+# Every decoder turns raw message bytes straight into the typed 7-field key
+# used for matching against ClickHouse:
+#   (datetime_ns, event_type, ticker, price, quantity, exchange, conditions)
+# Malformed payloads raise PayloadError; its reason ends up in bad_rows.json.
+
+import json
+import os
+import re
+import struct
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import msgpack
+except ImportError:  # only needed for --payload-format msgpack
+    msgpack = None
+
+PAYLOAD_FORMATS = ("json", "msgpack", "avro")
+
+# schema: ["datetime","event_type","ticker","price","quantity","exchange","conditions"]
+KEY_FIELDS = ("datetime", "event_type", "ticker", "price", "quantity", "exchange", "conditions")
+KEY_TYPES = (int, str, str, int, int, str, str)
+
+Decoder = Callable[[bytes], Tuple]
+
+class PayloadError(ValueError):
+    def __init__(self, reason: str, **extra):
+        super().__init__(reason)
+        self.reason = reason
+        self.extra = extra
+
+    def bad_row(self, msg) -> dict:
+        # extras end up in bad_rows.json, so coerce them to JSON-safe values
+        return {
+            "reason": self.reason,
+            "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
+            **{k: json_safe(v) for k, v in self.extra.items()},
+        }
+
+def json_safe(v):
+    # decoded payloads can hold bytes (msgpack bin) or non-string map keys
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    if isinstance(v, dict):
+        return {k if isinstance(k, str) else repr(k): json_safe(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [json_safe(x) for x in v]
+    return repr(v)
+
+# ---------- Mapping / sequence → key ----------
+
+# Key values are matched against ClickHouse and may be written back by
+# --repair, so they are type-checked rather than coerced: text slots must be
+# str, integer slots int (bool excluded). JSON may also carry integers as
+# digit-only strings.
+_DIGITS = re.compile(r"-?[0-9]+")
+
+def _as_int(name: str, v, digit_strings: bool) -> int:
+    if type(v) is int:
+        return v
+    if digit_strings and type(v) is str and _DIGITS.fullmatch(v):
+        return int(v)
+    raise TypeError(f"'{name}' must be an integer, got {type(v).__name__} {v!r}")
+
+def _as_str(name: str, v) -> str:
+    if type(v) is str:
+        return v
+    raise TypeError(f"'{name}' must be a string, got {type(v).__name__} {v!r}")
+
+def payload_to_key(obj: dict, digit_strings: bool = False) -> Tuple:
+    return (
+        _as_int("datetime", obj["datetime"], digit_strings),
+        _as_str("event_type", obj["event_type"]),
+        _as_str("ticker", obj["ticker"]),
+        _as_int("price", obj["price"], digit_strings),
+        _as_int("quantity", obj["quantity"], digit_strings),
+        _as_str("exchange", obj["exchange"]),
+        _as_str("conditions", obj["conditions"]),
+    )
+
+def object_to_key(obj: dict, digit_strings: bool = False) -> Tuple:
+    if "datetime" not in obj:
+        raise PayloadError("missing_datetime", payload=obj)
+    try:
+        _as_int("datetime", obj["datetime"], digit_strings)
+    except TypeError:
+        raise PayloadError("invalid_datetime", payload=obj)
+    try:
+        return payload_to_key(obj, digit_strings)
+    except KeyError as e:
+        raise PayloadError("invalid_fields", payload=obj, error=f"missing field {e}")
+    except TypeError as e:
+        raise PayloadError("invalid_fields", payload=obj, error=str(e))
+
+def sequence_to_key(values: Sequence) -> Tuple:
+    # positional records carry the fields in KEY_FIELDS order
+    if len(values) != len(KEY_FIELDS):
+        raise PayloadError("invalid_fields", payload=list(values),
+                           error=f"expected {len(KEY_FIELDS)} fields, got {len(values)}")
+    try:
+        dt = _as_int("datetime", values[0], False)
+    except TypeError:
+        raise PayloadError("invalid_datetime", payload=list(values))
+    try:
+        return (
+            dt,
+            _as_str("event_type", values[1]),
+            _as_str("ticker", values[2]),
+            _as_int("price", values[3], False),
+            _as_int("quantity", values[4], False),
+            _as_str("exchange", values[5]),
+            _as_str("conditions", values[6]),
+        )
+    except TypeError as e:
+        raise PayloadError("invalid_fields", payload=list(values), error=str(e))
+
+# ---------- JSON ----------
+
+def decode_json(raw: bytes) -> Tuple:
+    try:
+        obj = json.loads(raw)
+    except Exception as e:
+        raise PayloadError("invalid_json", error=str(e))
+    if not isinstance(obj, dict):
+        raise PayloadError("not_json_object", raw_sample=str(obj)[:200])
+    return object_to_key(obj, digit_strings=True)
+
+# ---------- msgpack ----------
+
+def decode_msgpack(raw: bytes) -> Tuple:
+    # Arrays (fields in KEY_FIELDS order) are the compact form and skip the
+    # dict entirely; maps keyed by field name are accepted too.
+    try:
+        obj = msgpack.unpackb(raw, use_list=False, raw=False)
+    except Exception as e:
+        raise PayloadError("invalid_msgpack", error=str(e))
+    if isinstance(obj, tuple):
+        return sequence_to_key(obj)
+    if isinstance(obj, dict):
+        return object_to_key(obj)
+    raise PayloadError("not_msgpack_record", raw_sample=str(obj)[:200])
+
+# ---------- Avro (binary, schemaless body) ----------
+
+# Per-type source snippets; each reads one value at `pos` into `v`.
+# Varints (long/int and string/bytes lengths) use Avro's zig-zag encoding.
+_AVRO_VARINT = """\
+    b = buf[pos]; pos += 1
+    if b & 0x80:
+        n = b & 0x7F; sh = 7
+        while True:
+            b = buf[pos]; pos += 1
+            n |= (b & 0x7F) << sh
+            if not b & 0x80:
+                break
+            sh += 7
+    else:
+        n = b
+    v = (n >> 1) ^ -(n & 1)
+"""
+_AVRO_SIZED = _AVRO_VARINT + """\
+    if v < 0:
+        raise ValueError("negative length")
+    e = pos + v
+    if e > len(buf):
+        raise ValueError("truncated")
+"""
+_AVRO_SNIPPETS = {
+    "long": _AVRO_VARINT,
+    "int": _AVRO_VARINT,
+    "string": _AVRO_SIZED + "    v = buf[pos:e].decode('utf-8'); pos = e\n",
+    "bytes": _AVRO_SIZED + "    v = bytes(buf[pos:e]); pos = e\n",
+    "boolean": "    v = buf[pos] != 0; pos += 1\n",
+    "float": "    v = unpack_from('<f', buf, pos)[0]; pos += 4\n",
+    "double": "    v = unpack_from('<d', buf, pos)[0]; pos += 8\n",
+}
+
+# Avro types that decode to exactly the Python type a key slot needs.
+_AVRO_KEY_TYPES = {int: ("long", "int"), str: ("string",)}
+
+class AvroRecordDecoder:
+    """Decodes one flat Avro record straight into the 7-field key.
+
+    The schema is compiled once into a single generated read function, so
+    decoding is one pass over the bytes with no per-field calls and no
+    per-record dict. Fields outside the key are read and dropped; key fields
+    must already have the key's type (long/int for integers, string for text).
+    """
+
+    def __init__(self, schema: dict):
+        if not isinstance(schema, dict) or schema.get("type") != "record":
+            raise ValueError("Avro schema must be a record")
+        names: List[str] = []
+        body: List[str] = []
+        for field in schema.get("fields", []):
+            ftype = field["type"]
+            if isinstance(ftype, dict):  # e.g. {"type": "long", "logicalType": "timestamp-nanos"}
+                ftype = ftype.get("type")
+            if ftype not in _AVRO_SNIPPETS:
+                raise ValueError(f"Unsupported Avro type {ftype!r} for field '{field['name']}'")
+            if field["name"] in KEY_FIELDS:
+                want = KEY_TYPES[KEY_FIELDS.index(field["name"])]
+                if ftype not in _AVRO_KEY_TYPES[want]:
+                    raise ValueError(f"Avro field '{field['name']}' must be one of {_AVRO_KEY_TYPES[want]}")
+            body.append(_AVRO_SNIPPETS[ftype] + f"    f{len(names)} = v\n")
+            names.append(field["name"])
+        missing = [f for f in KEY_FIELDS if f not in names]
+        if missing:
+            raise ValueError(f"Avro schema is missing key fields: {missing}")
+        key = ", ".join(f"f{names.index(f)}" for f in KEY_FIELDS)
+        src = "def read(buf, pos):\n" + "".join(body) + f"    return ({key}), pos\n"
+        scope = {"unpack_from": struct.unpack_from}
+        exec(compile(src, f"<avro:{schema.get('name', 'record')}>", "exec"), scope)
+        self._read = scope["read"]
+
+    def decode(self, buf: bytes, pos: int = 0) -> Tuple:
+        try:
+            key, pos = self._read(buf, pos)
+        except Exception as e:
+            raise PayloadError("invalid_avro", error=f"{type(e).__name__}: {e}")
+        if pos != len(buf):
+            raise PayloadError("invalid_avro", error=f"{len(buf) - pos} trailing bytes")
+        return key
+
+def load_avro_schema(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+class LocalSchemaRegistry:
+    """Stand-in for a schema registry: a directory of '<schema_id>.avsc' files.
+
+    Messages use the registry wire format: magic byte 0, 4-byte big-endian
+    schema id, then the Avro body.
+    """
+
+    def __init__(self, directory: str):
+        if not os.path.isdir(directory):
+            raise ValueError(f"Schema directory '{directory}' not found")
+        self.directory = directory
+        self._decoders: Dict[int, Optional[AvroRecordDecoder]] = {}
+
+    def decoder_for(self, schema_id: int) -> Optional[AvroRecordDecoder]:
+        if schema_id not in self._decoders:
+            path = os.path.join(self.directory, f"{schema_id}.avsc")
+            self._decoders[schema_id] = (
+                AvroRecordDecoder(load_avro_schema(path)) if os.path.isfile(path) else None
+            )
+        return self._decoders[schema_id]
+
+    def decode(self, raw: bytes) -> Tuple:
+        if raw is None or len(raw) < 5 or raw[0] != 0:
+            raise PayloadError("invalid_avro", error="missing schema registry framing")
+        schema_id = int.from_bytes(raw[1:5], "big")
+        dec = self.decoder_for(schema_id)
+        if dec is None:
+            raise PayloadError("unknown_schema_id", schema_id=schema_id)
+        return dec.decode(raw, 5)
+
+# ---------- Factory ----------
+
+def make_decoder(payload_format: str, avro_schema: Optional[str] = None,
+                 schema_dir: Optional[str] = None) -> Decoder:
+    if payload_format == "json":
+        return decode_json
+    if payload_format == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("--payload-format msgpack needs the 'msgpack' package (see validation/requirements.txt)")
+        return decode_msgpack
+    if payload_format == "avro":
+        if bool(avro_schema) == bool(schema_dir):
+            raise ValueError("--payload-format avro needs exactly one of --avro-schema or --schema-dir")
+        if schema_dir:
+            return LocalSchemaRegistry(schema_dir).decode
+        return AvroRecordDecoder(load_avro_schema(avro_schema)).decode
+    raise ValueError(f"Unknown payload format '{payload_format}' (expected one of {PAYLOAD_FORMATS})")
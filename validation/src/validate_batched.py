@@ -2,10 +2,13 @@
 # validate_batched_3.py — batched validator; JSON outputs (arrays), not JSONL
 
 import argparse
+import hashlib
 import json
+import re
 import sys
 import time
 from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Iterable, List, Tuple, Optional
@@ -14,6 +17,8 @@ from uuid import uuid4
 from confluent_kafka import Consumer, TopicPartition, KafkaError
 from clickhouse_driver import Client
 
+from payload_formats import KEY_TYPES, PAYLOAD_FORMATS, PayloadError, make_decoder
+
 # ------ Imports for sending summary email after validation --------
 from dotenv import load_dotenv
 import os
@@ -40,18 +45,6 @@ def parse_start_time(arg: str) -> int:
     dt = datetime.strptime(s, DATETIME_FMT).replace(tzinfo=timezone.utc)
     return int(dt.timestamp() * 1000)
 
-def payload_to_key(obj: dict) -> Tuple:
-    # schema: ["datetime","event_type","ticker","price","quantity","exchange","conditions"]
-    return (
-        int(obj["datetime"]),
-        str(obj["event_type"]),
-        str(obj["ticker"]),
-        int(obj["price"]),
-        int(obj["quantity"]),
-        str(obj["exchange"]),
-        str(obj["conditions"]),
-    )
-
 def rows_to_keys(rows: Iterable[Tuple]) -> Iterable[Tuple]:
     for r in rows:
         yield (
@@ -64,10 +57,6 @@ def rows_to_keys(rows: Iterable[Tuple]) -> Iterable[Tuple]:
             str(r[6]),
         )
 
-def min_max_payload_ns(objs: List[dict]) -> Tuple[int, int]:
-    vals = [int(o["datetime"]) for o in objs]
-    return min(vals), max(vals)
-
 # ---------- Email ----------
 
 def send_validation_email(*, success: bool, started_at: datetime, finished_at: datetime,
@@ -133,44 +122,68 @@ Notes: {notes or "-"}
 
 # ---------- Kafka helpers ----------
 
-def topic_partitions(consumer: Consumer, topic: str) -> List[int]:
-    md = consumer.list_topics(topic=topic, timeout=5.0)
-    if topic not in md.topics:
-        raise RuntimeError(f"Topic '{topic}' not found in metadata.")
-    return [p.id for p in md.topics[topic].partitions.values()]
-
-def seek_to_timestamp(consumer: Consumer, topic: str, partitions: List[int], ts_ms: int) -> None:
+def topic_partitions(consumer: Consumer, topics: List[str]) -> Dict[str, List[int]]:
+    # one metadata request covers every topic in the run
+    md = consumer.list_topics(timeout=5.0)
+    parts: Dict[str, List[int]] = {}
+    for topic in topics:
+        if topic not in md.topics:
+            raise RuntimeError(f"Topic '{topic}' not found in metadata.")
+        parts[topic] = [p.id for p in md.topics[topic].partitions.values()]
+    return parts
+
+def timestamp_offsets(consumer: Consumer, topic: str, partitions: List[int], ts_ms: int) -> List[TopicPartition]:
     tps = [TopicPartition(topic, p, ts_ms) for p in partitions]
     looked = consumer.offsets_for_times(tps, timeout=10.0)
-    assigned: List[TopicPartition] = []
+    start: List[TopicPartition] = []
     for tp in looked:
         if tp.offset is None or tp.offset < 0:
             low, _ = consumer.get_watermark_offsets(TopicPartition(topic, tp.partition), timeout=10.0)
             tp.offset = low
-        assigned.append(tp)
-    consumer.assign(assigned)
-
-def last_timestamp_ms_for_partition(consumer: Consumer, topic: str, partition: int) -> Optional[int]:
-    low, high = consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=10.0)
-    if high is None or high == low:
-        return None
-    tp = TopicPartition(topic, partition, high - 1)
-    consumer.assign([tp])
-    msg = consumer.poll(timeout=5.0)
-    if msg is None or msg.error():
-        return None
-    _, ts = msg.timestamp()
-    if ts is None or ts < 0:
-        return None
-    return int(ts)
-
-def topic_stop_time_ms(consumer: Consumer, topic: str, partitions: List[int]) -> Optional[int]:
-    latest: List[int] = []
-    for p in partitions:
-        ts = last_timestamp_ms_for_partition(consumer, topic, p)
-        if ts is not None:
-            latest.append(ts)
-    return max(latest) if latest else None
+        start.append(tp)
+    return start
+
+def stop_times_ms(consumer: Consumer, parts_by_topic: Dict[str, List[int]],
+                  timeout_s: float = 5.0) -> Dict[str, Optional[int]]:
+    # Latest message timestamp per topic. Every partition's last message is
+    # fetched in a single assign/poll round across all topics, so startup
+    # cost does not grow with the number of pairs or partitions.
+    latest: Dict[str, Optional[int]] = {t: None for t in parts_by_topic}
+    tps: List[TopicPartition] = []
+    for topic, parts in parts_by_topic.items():
+        for p in parts:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, p), timeout=10.0)
+            if high is not None and high > low:
+                tps.append(TopicPartition(topic, p, high - 1))
+    if not tps:
+        return latest
+
+    waiting = {(tp.topic, tp.partition): tp.offset for tp in tps}
+    consumer.assign(tps)
+    deadline = time.time() + timeout_s
+    while waiting:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        msg = consumer.poll(timeout=min(remaining, 1.0))
+        if msg is None:
+            continue
+        key = (msg.topic(), msg.partition())
+        if msg.error():
+            if msg.error().code() == KafkaError._PARTITION_EOF:
+                waiting.pop(key, None)
+            continue
+        if key not in waiting or msg.offset() < waiting[key]:
+            continue
+        del waiting[key]
+        _, ts = msg.timestamp()
+        if ts is not None and ts >= 0:
+            t = latest[msg.topic()]
+            latest[msg.topic()] = ts if t is None else max(t, int(ts))
+    if waiting:
+        print(f"[Init] No last message within {timeout_s:.0f}s for {len(waiting)} partition(s): "
+              f"{sorted(waiting)}")
+    return latest
 
 def compute_stop_offsets(consumer: Consumer, topic: str, parts: List[int], stop_ms: int) -> Dict[int, int]:
     query_ts = stop_ms + 1  # exclusive upper bound
@@ -185,11 +198,10 @@ def compute_stop_offsets(consumer: Consumer, topic: str, parts: List[int], stop_
             stops[tp.partition] = tp.offset
     return stops
 
-def reached_stop_offsets(consumer: Consumer, stop_offsets: Dict[int, int]) -> bool:
-    assignments = consumer.assignment()
-    if not assignments:
+def reached_stop_offsets(consumer: Consumer, topic: str, stop_offsets: Dict[int, int]) -> bool:
+    if not stop_offsets:
         return False
-    positions = consumer.position(assignments)
+    positions = consumer.position([TopicPartition(topic, p) for p in stop_offsets])
     for pos in positions:
         need = stop_offsets.get(pos.partition, None)
         have = pos.offset if pos.offset is not None else -1
@@ -219,10 +231,146 @@ def ch_query_rows(client: Client, table: str, start_ns: int, end_ns: int) -> Lis
     """
     return client.execute(q, params={"s": start_ns, "e": end_ns})
 
+# ---------- Repair ----------
+
+KEY_COLUMNS = ("datetime", "event_type", "ticker", "price", "quantity", "exchange", "conditions")
+
+def ch_datetime_divisor(client: Client, table: str) -> int:
+    # keys carry ns; raw ints for DateTime/DateTime64(p) must be in the column's own unit
+    for row in client.execute(f"DESCRIBE TABLE {table}"):
+        if row[0] != "datetime":
+            continue
+        m = re.search(r"DateTime64\((\d+)", row[1])
+        if m:
+            return 10 ** (9 - int(m.group(1)))
+        if "DateTime" in row[1]:
+            return 10 ** 9
+        raise RuntimeError(f"Unsupported type for {table}.datetime: {row[1]}")
+    raise RuntimeError(f"Column 'datetime' not found in {table}")
+
+def ch_partition_granularity(client: Client, database: str, table: str) -> str:
+    # map the table's PARTITION BY onto the repair grouping (day / month / none)
+    db, _, name = table.rpartition(".")
+    rows = client.execute(
+        "SELECT partition_key FROM system.tables WHERE database = %(d)s AND name = %(t)s",
+        params={"d": db or database, "t": name},
+    )
+    if not rows:
+        raise RuntimeError(f"Table {table} not found in system.tables")
+    key = rows[0][0].replace(" ", "")
+    if not key:
+        return "none"
+    if "toYYYYMMDD(" in key or "toDate(" in key:
+        return "day"
+    if "toYYYYMM(" in key or "toStartOfMonth(" in key:
+        return "month"
+    print(f"[Repair] Unrecognised PARTITION BY '{rows[0][0]}' for {table}; grouping blocks by day "
+          f"(pass --repair-partition to override)")
+    return "day"
+
+def repair_partition_id(dt_ns: int, partition_by: str) -> str:
+    if partition_by == "none":
+        return "all"
+    d = datetime.fromtimestamp(dt_ns // 1_000_000_000, tz=timezone.utc)
+    return d.strftime("%Y%m%d" if partition_by == "day" else "%Y%m")
+
+def repair_blocks(rows: Counter, partition_by: str, block_size: int) -> Iterable[Tuple[str, int, List[Tuple]]]:
+    # Rows are sorted so the same missing set always yields the same blocks
+    # (and therefore the same dedup tokens) across retries and re-runs.
+    by_part: Dict[str, List[Tuple]] = {}
+    for key, cnt in rows.items():
+        by_part.setdefault(repair_partition_id(key[0], partition_by), []).extend([key] * cnt)
+    for part in sorted(by_part):
+        part_rows = sorted(by_part[part])
+        for i in range(0, len(part_rows), block_size):
+            yield part, i // block_size, part_rows[i:i + block_size]
+
+def repair_insert_token(table: str, partition: str, index: int, block: List[Tuple]) -> str:
+    # index keeps repeated identical blocks (duplicate keys) from sharing a token
+    h = hashlib.sha256(f"{table}|{partition}|{index}".encode("utf-8"))
+    for key in block:
+        h.update(repr(key).encode("utf-8"))
+    return f"repair-{partition}-{h.hexdigest()[:32]}"
+
+def repair_key_ok(key: Tuple) -> bool:
+    # last line of defence before writing into the production table
+    return len(key) == len(KEY_TYPES) and all(type(v) is t for v, t in zip(key, KEY_TYPES))
+
+def run_repair(client: Client, args, state: "RunState") -> dict:
+    # Keys that went missing in one window but showed up later as CH overflow
+    # are in both counters; only the net difference is really absent.
+    to_insert = state.missing_in_ch - state.pending_ch
+    invalid = Counter({k: c for k, c in to_insert.items() if not repair_key_ok(k)})
+    if invalid:
+        print(f"[Repair] Skipping {sum(invalid.values())} rows whose key types do not match the table")
+        to_insert -= invalid
+    divisor = ch_datetime_divisor(client, state.table)
+    partition_by = args.repair_partition
+    if partition_by == "auto":
+        partition_by = ch_partition_granularity(client, args.ch_database, state.table)
+    insert_q = f"INSERT INTO {state.table} ({', '.join(KEY_COLUMNS)}) VALUES"
+
+    t0 = time.perf_counter()
+    rows_inserted = 0
+    for part, index, block in repair_blocks(to_insert, partition_by, args.repair_block_size):
+        columns = [list(c) for c in zip(*block)]
+        if divisor != 1:
+            columns[0] = [v // divisor for v in columns[0]]
+        token = repair_insert_token(state.table, part, index, block)
+        settings = {"insert_deduplicate": 1, "insert_deduplication_token": token}
+
+        bt0 = time.perf_counter()
+        for attempt in range(1, args.repair_retries + 2):
+            try:
+                client.execute(insert_q, columns, columnar=True, settings=settings)
+                break
+            except Exception as e:
+                if attempt > args.repair_retries:
+                    raise
+                print(f"[Repair] Insert of {len(block)} rows for partition {part} failed "
+                      f"(attempt {attempt}): {e}; retrying")
+                time.sleep(min(2 ** attempt, 30))
+        rows_inserted += len(block)
+        state.repair_blocks_list.append({
+            "partition": part,
+            "block": index,
+            "rows": len(block),
+            "insert_token": token,
+            "attempts": attempt,
+            "seconds": round(time.perf_counter() - bt0, 3),
+        })
+        print(f"[Repair] partition={part} rows={len(block)} attempts={attempt}")
+
+    secs = time.perf_counter() - t0
+    return {
+        "rows_inserted": rows_inserted,
+        "blocks": len(state.repair_blocks_list),
+        "partitions": len({b["partition"] for b in state.repair_blocks_list}),
+        "block_size": args.repair_block_size,
+        "partition_by": partition_by,
+        "rows_skipped_invalid": sum(invalid.values()),
+        "seconds": round(secs, 3),
+        "rows_per_sec": round(rows_inserted / secs) if secs > 0 else 0,
+    }
+
 # ---------- State ----------
 
 @dataclass
 class RunState:
+    # one per topic/table pair
+    topic: str = ""
+    table: str = ""
+    stop_offsets: Dict[int, int] = None
+    batch_keys: List[Tuple] = None
+    batches: int = 0
+    paused: bool = False
+    done: bool = False
+    elapsed_s: Optional[float] = None
+    finished_at: Optional[datetime] = None
+    # ClickHouse side: own connection + single worker thread (batches stay in order)
+    client: Optional[Client] = None
+    worker: Optional[ThreadPoolExecutor] = None
+    inflight: List[Tuple[Future, Optional[List[TopicPartition]]]] = None
     ch_min_scanned_ns: Optional[int] = None
     ch_watermark_ns: Optional[int] = None
     pending_ch: Counter = None
@@ -235,8 +383,15 @@ class RunState:
     bad_rows_list: List[dict] = None
     ch_query_windows_list: List[dict] = None
     details_list: List[dict] = None
+    repair_blocks_list: List[dict] = None
 
     def __post_init__(self):
+        if self.stop_offsets is None:
+            self.stop_offsets = {}
+        if self.batch_keys is None:
+            self.batch_keys = []
+        if self.inflight is None:
+            self.inflight = []
         if self.pending_ch is None:
             self.pending_ch = Counter()
         if self.missing_in_ch is None:
@@ -247,6 +402,8 @@ class RunState:
             self.ch_query_windows_list = []
         if self.details_list is None:
             self.details_list = []
+        if self.repair_blocks_list is None:
+            self.repair_blocks_list = []
 
 # ---------- Batch processing ----------
 
@@ -254,44 +411,14 @@ def process_batch(
     client: Client,
     args,
     state: RunState,
-    batch_msgs: List[Tuple[object, dict]],
+    batch_keys: List[Tuple],
 ):
-    if not batch_msgs:
+    # batch_keys are already-typed 7-field keys; bad rows were logged at decode time
+    if not batch_keys:
         return
 
-    # Split good/bad rows
-    good_objs: List[dict] = []
-    for msg, obj in batch_msgs:
-        if not isinstance(obj, dict):
-            state.bad_rows_list.append({
-                "reason": "not_json_object",
-                "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
-                "raw_sample": str(obj)[:200],
-            })
-            continue
-        if "datetime" not in obj:
-            state.bad_rows_list.append({
-                "reason": "missing_datetime",
-                "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
-                "payload": obj,
-            })
-            continue
-        try:
-            _ = int(obj["datetime"])
-        except Exception:
-            state.bad_rows_list.append({
-                "reason": "invalid_datetime",
-                "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
-                "payload": obj,
-            })
-            continue
-        good_objs.append(obj)
-
-    if not good_objs:
-        batch_msgs.clear()
-        return
-
-    batch_start_ns, batch_end_ns = min_max_payload_ns(good_objs)
+    batch_start_ns = min(k[0] for k in batch_keys)
+    batch_end_ns = max(k[0] for k in batch_keys)
 
     # Backfill unseen slice into pending_ch
     if state.ch_min_scanned_ns is None:
@@ -299,7 +426,7 @@ def process_batch(
     elif batch_start_ns < state.ch_min_scanned_ns:
         backfill_end = min(state.ch_min_scanned_ns - 1, batch_end_ns)
         if batch_start_ns <= backfill_end:
-            bf_rows = ch_query_rows(client, args.table, batch_start_ns, backfill_end)
+            bf_rows = ch_query_rows(client, state.table, batch_start_ns, backfill_end)
             state.total_ch_window += len(bf_rows)
             for k in rows_to_keys(bf_rows):
                 state.pending_ch[k] += 1
@@ -313,7 +440,7 @@ def process_batch(
 
     # Perform CH query and log it
     if ch_start_ns <= batch_end_ns:
-        ch_rows = ch_query_rows(client, args.table, ch_start_ns, batch_end_ns)
+        ch_rows = ch_query_rows(client, state.table, ch_start_ns, batch_end_ns)
     else:
         ch_rows = []
 
@@ -321,16 +448,15 @@ def process_batch(
         "window_start_ns": ch_start_ns,
         "window_end_ns": batch_end_ns,
         "row_count": len(ch_rows),
-        "table": args.table,
+        "table": state.table,
     })
 
     state.total_ch_window += len(ch_rows)
 
     # Normalize → counters
-    kafka_keys = [payload_to_key(o) for o in good_objs]
     ch_keys = list(rows_to_keys(ch_rows))
 
-    kcnt = Counter(kafka_keys)
+    kcnt = Counter(batch_keys)
     ccnt = Counter(ch_keys)
     state.total_kafka += sum(kcnt.values())
 
@@ -361,14 +487,219 @@ def process_batch(
 
     # Advance CH watermark; clear batch
     state.ch_watermark_ns = max(state.ch_watermark_ns or batch_end_ns, batch_end_ns)
-    batch_msgs.clear()
+    batch_keys.clear()
 
 # ---------- Core run ----------
 
+def parse_topic_table_map(spec: str) -> Dict[str, str]:
+    # same syntax as the sink's topic2TableMap: "topic1=table1,topic2=table2"
+    pairs: Dict[str, str] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        topic, sep, table = item.partition("=")
+        if not sep or not topic.strip() or not table.strip():
+            raise ValueError(f"Bad topic=table entry: '{item}'")
+        if topic.strip() in pairs:
+            raise ValueError(f"Topic '{topic.strip()}' appears more than once")
+        pairs[topic.strip()] = table.strip()
+    if not pairs:
+        raise ValueError("Topic/table map is empty")
+    return pairs
+
+def pair_output_path(path: Optional[str], topic: str, multi: bool) -> Optional[str]:
+    # single pair keeps the exact paths; multi-pair runs get one file per topic
+    if not path or not multi:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{topic}{ext}"
+
+def pair_assignment(state: RunState) -> List[TopicPartition]:
+    return [TopicPartition(state.topic, p) for p in state.stop_offsets]
+
+# Batches per pair queued or running on its ClickHouse worker before that
+# pair's partitions are paused; the other pairs keep polling meanwhile.
+MAX_INFLIGHT_BATCHES = 2
+
+def commit_pair(consumer: Consumer, state: RunState, offsets: List[TopicPartition]) -> None:
+    # only this topic's positions: other topics may hold consumed-but-unprocessed rows
+    try:
+        consumer.commit(offsets=offsets, asynchronous=False)
+    except Exception as e:
+        print(f"[Warn] Commit failed for {state.topic}: {e}")
+
+def drain_pair(consumer: Consumer, state: RunState, keep: int) -> None:
+    # Reap finished batches in order (waiting while more than `keep` are
+    # outstanding); worker exceptions surface here. Offsets are committed
+    # only once their batch has been compared.
+    while state.inflight and (len(state.inflight) > keep or state.inflight[0][0].done()):
+        fut, offsets = state.inflight.pop(0)
+        fut.result()
+        if offsets is not None:
+            commit_pair(consumer, state, offsets)
+
+def submit_batch(consumer: Consumer, args, state: RunState) -> None:
+    batch, state.batch_keys = state.batch_keys, []
+    # the buffer is empty now, so this topic's positions are exactly the end of `batch`
+    offsets = consumer.position(pair_assignment(state)) if args.commit else None
+    state.inflight.append((state.worker.submit(process_batch, state.client, args, state, batch), offsets))
+    state.batches += 1
+    # Normally balance_pairs has paused the pair before this happens; messages
+    # fetched before the pause can still fill another batch, so cap it here.
+    drain_pair(consumer, state, keep=MAX_INFLIGHT_BATCHES)
+
+def finish_pair(consumer: Consumer, args, state: RunState, t0: float, why: str) -> None:
+    consumer.pause(pair_assignment(state))
+    submit_batch(consumer, args, state)
+    drain_pair(consumer, state, keep=0)
+    state.done = True
+    state.elapsed_s = time.perf_counter() - t0
+    state.finished_at = datetime.now(timezone.utc)
+    print(f"[Stop] {state.topic}: {why}.")
+
+def balance_pairs(consumer: Consumer, states: List[RunState]) -> None:
+    # Pause a topic while it is more than one batch ahead of the slowest
+    # active one (so a busy topic cannot starve the others on the shared
+    # consumer) or while its ClickHouse worker is backed up.
+    active = [st for st in states if not st.done]
+    if not active:
+        return
+    floor = min(st.batches for st in active)
+    for st in active:
+        drain_pair(consumer, st, keep=MAX_INFLIGHT_BATCHES)
+        hold = st.batches > floor + 1 or len(st.inflight) >= MAX_INFLIGHT_BATCHES
+        if hold != st.paused:
+            (consumer.pause if hold else consumer.resume)(pair_assignment(st))
+            st.paused = hold
+
+def report_pair(client: Client, args, state: RunState, start_dt: datetime, multi: bool) -> dict:
+    missing_total = sum(state.missing_in_ch.values())
+    extra_total = sum(state.pending_ch.values())
+    matched_total = state.matched_direct + state.matched_via_overflow
+    mismatch_total = missing_total + extra_total
+    elapsed = state.elapsed_s
+
+    summary = {
+        "topic": state.topic,
+        "table": state.table,
+        "kafka_messages_consumed": state.total_kafka,
+        "clickhouse_rows_scanned": state.total_ch_window,
+        "total_matched": matched_total,
+        "total_mismatched": mismatch_total,
+        "matched_direct": state.matched_direct,
+        "matched_via_overflow": state.matched_via_overflow,
+        "still_missing_in_clickhouse": missing_total,
+        "still_extra_in_clickhouse": extra_total,
+        "payload_format": args.payload_format,
+        "elapsed_seconds": round(elapsed, 3),
+        "repair": None,
+    }
+
+    # Validation outputs are written before any repair, so a failing repair
+    # cannot lose them.
+    summary_path = pair_output_path(args.summary, state.topic, multi)
+    if summary_path:
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    # Details as JSON array (was JSONL)
+    details_path = pair_output_path(args.details, state.topic, multi)
+    if details_path:
+        # limit samples like before
+        out = []
+        def add_samples(counter: Counter, title: str, limit: int = 100):
+            written = 0
+            for key, cnt in counter.items():
+                out.append({"title": title, "record": key, "count": cnt})
+                written += 1
+                if written >= limit:
+                    break
+        add_samples(state.missing_in_ch, "Missing in ClickHouse")
+        add_samples(state.pending_ch, "Extra in ClickHouse (unmatched)")
+        with open(details_path, "w") as f:
+            json.dump(out, f, indent=2)
+
+    # Bad rows + CH query windows as JSON arrays (was JSONL)
+    bad_rows_path = pair_output_path(args.bad_rows, state.topic, multi)
+    if bad_rows_path:
+        with open(bad_rows_path, "w") as f:
+            json.dump(state.bad_rows_list, f, indent=2)
+
+    ch_query_log_path = pair_output_path(args.ch_query_log, state.topic, multi)
+    if ch_query_log_path:
+        with open(ch_query_log_path, "w") as f:
+            json.dump(state.ch_query_windows_list, f, indent=2)
+
+    repair = None
+    if args.repair:
+        try:
+            repair = run_repair(client, args, state)
+        except Exception as e:
+            print(f"[Repair] Failed for {state.topic} → {state.table}: {e}")
+            repair = {
+                "error": f"{type(e).__name__}: {e}",
+                "rows_inserted": sum(b["rows"] for b in state.repair_blocks_list),
+                "blocks": len(state.repair_blocks_list),
+            }
+        summary["repair"] = repair
+        if summary_path:
+            with open(summary_path, "w") as f:
+                json.dump(summary, f, indent=2)
+
+        repair_log_path = pair_output_path(args.repair_log, state.topic, multi)
+        if repair_log_path:
+            with open(repair_log_path, "w") as f:
+                json.dump(state.repair_blocks_list, f, indent=2)
+
+    if repair is None:
+        repair_note = ""
+    elif "error" in repair:
+        repair_note = f", repair FAILED after {repair['rows_inserted']} rows: {repair['error']}"
+    else:
+        repair_note = f", repaired={repair['rows_inserted']} rows in {repair['seconds']}s"
+
+    send_validation_email(
+        success=not (repair and "error" in repair),
+        started_at=start_dt,
+        finished_at=state.finished_at,
+        rows_validated=state.total_kafka,
+        rows_matched=matched_total,
+        rows_mismatched=mismatch_total,
+        topic=state.topic,
+        notes=f"table={state.table}, batch_size={args.batch_size}, commit={bool(args.commit)}, "
+              f"payload_format={args.payload_format}" + repair_note
+    )
+
+    # --- Human-readable console summary ---
+    elapsed_td = timedelta(seconds=round(elapsed, 3))
+    print(f"\n===== Validation Summary: {state.topic} → {state.table} =====")
+    print(f"Kafka messages consumed: {state.total_kafka}")
+    print(f"ClickHouse rows scanned (summed windows): {state.total_ch_window}")
+    print(f"Total matched: {matched_total}")
+    print(f"Total mismatched: {mismatch_total}")
+    print(f"Matched directly (same window): {state.matched_direct}")
+    print(f"Matched via CH overflow from previous windows: {state.matched_via_overflow}")
+    print(f"Still missing in ClickHouse: {missing_total}")
+    print(f"Still extra in ClickHouse: {extra_total}")
+    print(f"Elapsed: {elapsed_td} ({elapsed:.3f}s)")
+    if repair and "error" in repair:
+        print(f"Repair FAILED after {repair['rows_inserted']} rows in {repair['blocks']} blocks: {repair['error']}")
+    elif repair:
+        print(f"Repaired (inserted into ClickHouse): {repair['rows_inserted']} rows in "
+              f"{repair['blocks']} blocks / {repair['partitions']} partitions, "
+              f"{repair['seconds']:.3f}s ({repair['rows_per_sec']:,} rows/s)")
+    print("Done.")
+
+    summary["summary_file"] = summary_path
+    return summary
+
 def run_validation(args):
     t0 = time.perf_counter()
     start_dt = datetime.now(timezone.utc)
 
+    decode = make_decoder(args.payload_format, args.avro_schema, args.schema_dir)
+
     consumer = Consumer({
         "bootstrap.servers": args.broker,
         "group.id": f"batch-validator-{uuid4()}",
@@ -380,171 +711,140 @@ def run_validation(args):
         "fetch.max.bytes": 64 * 1024 * 1024,
         "queued.min.messages": 100000,
     })
-    consumer.subscribe([args.topic])
+    topics = list(args.pairs)
+    consumer.subscribe(topics)
 
-    parts = topic_partitions(consumer, args.topic)
+    parts_by_topic = topic_partitions(consumer, topics)
     start_ms = parse_start_time(args.start_time)
-    seek_to_timestamp(consumer, args.topic, parts, start_ms)
-
-    stop_ms = topic_stop_time_ms(consumer, args.topic, parts)
-    seek_to_timestamp(consumer, args.topic, parts, start_ms)
 
-    if stop_ms is None:
-        print("Topic appears to be empty. Exiting.")
+    # Stop discovery is one assign/poll round for every pair; start offsets
+    # for all pairs are then assigned together.
+    stop_ms_by_topic = stop_times_ms(consumer, parts_by_topic)
+    states: List[RunState] = []
+    skipped: List[dict] = []
+    start_tps: List[TopicPartition] = []
+    for topic, table in args.pairs.items():
+        parts = parts_by_topic[topic]
+        stop_ms = stop_ms_by_topic[topic]
+        if stop_ms is None:
+            print(f"[Init] Topic '{topic}' appears to be empty; skipping.")
+            skipped.append({"topic": topic, "table": table, "skipped": "topic appears to be empty"})
+            continue
+        state = RunState(topic=topic, table=table,
+                         stop_offsets=compute_stop_offsets(consumer, topic, parts, stop_ms))
+        states.append(state)
+        start_tps.extend(timestamp_offsets(consumer, topic, parts, start_ms))
+        print(f"[Init] {topic} → {table}: start >= {start_ms} ms, stop {stop_ms} ms (inclusive).")
+        print(f"[Init] {topic} stop offsets: {state.stop_offsets}")
+
+    if not states:
+        print("Topic appears to be empty. Exiting." if len(topics) == 1 else "All topics appear to be empty. Exiting.")
         consumer.close()
-        return
+        return True
 
-    stop_offsets = compute_stop_offsets(consumer, args.topic, parts, stop_ms)
-    print(f"[Init] Start >= {start_ms} ms, stop {stop_ms} ms (inclusive).")
-    print(f"[Init] Stop offsets: {stop_offsets}")
+    consumer.assign(start_tps)
+    by_topic = {st.topic: st for st in states}
 
-    client = ch_client(args)
-    state = RunState()
+    # One ClickHouse connection and worker thread per pair (clickhouse_driver
+    # clients are not thread-safe), so window queries of different topics
+    # overlap with each other and with polling/decoding on this thread.
+    for st in states:
+        st.client = ch_client(args)
+        st.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ch-{st.topic}")
 
-    batch_msgs: List[Tuple[object, dict]] = []
+    def check_stops(why: str) -> None:
+        for st in states:
+            if st.done:
+                continue
+            if reached_stop_offsets(consumer, st.topic, st.stop_offsets):
+                finish_pair(consumer, args, st, t0, why)
+        balance_pairs(consumer, states)
 
-    while True:
+    while not all(st.done for st in states):
         msg = consumer.poll(timeout=0.05)
         if msg is None:
-            if reached_stop_offsets(consumer, stop_offsets):
-                process_batch(client, args, state, batch_msgs)
-                print("[Stop] Reached all stop offsets; exiting.")
-                break
+            check_stops("reached all stop offsets")
             continue
 
         if msg.error():
             if msg.error().code() == KafkaError._PARTITION_EOF:
-                if reached_stop_offsets(consumer, stop_offsets):
-                    process_batch(client, args, state, batch_msgs)
-                    print("[Stop] EOF and reached stop offsets; exiting.")
-                    break
+                check_stops("EOF and reached stop offsets")
                 continue
             else:
                 print(f"[Warn] Kafka error: {msg.error()}")
                 continue
 
-        # Decode payload JSON; log invalid JSON as bad row
-        try:
-            obj = json.loads(msg.value().decode("utf-8"))
-        except Exception as e:
-            state.bad_rows_list.append({
-                "reason": "invalid_json",
-                "topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
-                "error": str(e)
-            })
+        state = by_topic.get(msg.topic())
+        if state is None or state.done:
             continue
 
-        batch_msgs.append((msg, obj))
-
-        if len(batch_msgs) >= args.batch_size:
-            process_batch(client, args, state, batch_msgs)
-            if args.commit:
-                try:
-                    consumer.commit(asynchronous=False)
-                except Exception as e:
-                    print(f"[Warn] Commit failed: {e}")
-            if reached_stop_offsets(consumer, stop_offsets):
-                print("[Stop] Reached all stop offsets after batch; exiting.")
-                break
-
-    consumer.close()
+        # Decode payload straight to its key; log undecodable payloads as bad rows
+        try:
+            key = decode(msg.value())
+        except PayloadError as e:
+            state.bad_rows_list.append(e.bad_row(msg))
+            continue
 
-    # --- Final summary / details ---
-    missing_total = sum(state.missing_in_ch.values())
-    extra_total = sum(state.pending_ch.values())
-    matched_total = state.matched_direct + state.matched_via_overflow
-    mismatch_total = missing_total + extra_total
-    elapsed = time.perf_counter() - t0
+        state.batch_keys.append(key)
 
-    end_dt = datetime.now(timezone.utc)
+        if len(state.batch_keys) >= args.batch_size:
+            submit_batch(consumer, args, state)
+            if reached_stop_offsets(consumer, state.topic, state.stop_offsets):
+                finish_pair(consumer, args, state, t0, "reached all stop offsets after batch")
+            balance_pairs(consumer, states)
 
-    send_validation_email(
-        success=True,
-        started_at=start_dt,
-        finished_at=end_dt,
-        rows_validated=state.total_kafka,
-        rows_matched=matched_total,
-        rows_mismatched=mismatch_total,
-        topic=args.topic,
-        notes=f"batch_size={args.batch_size}, commit={bool(args.commit)}"
-    )
+    consumer.close()
+    for st in states:
+        st.worker.shutdown()
 
-    # --- Human-readable console summary ---
-    elapsed_td = timedelta(seconds=round(elapsed, 3))
-    print("\n===== Validation Summary =====")
-    print(f"Kafka messages consumed: {state.total_kafka}")
-    print(f"ClickHouse rows scanned (summed windows): {state.total_ch_window}")
-    print(f"Total matched: {matched_total}")
-    print(f"Total mismatched: {mismatch_total}")
-    print(f"Matched directly (same window): {state.matched_direct}")
-    print(f"Matched via CH overflow from previous windows: {state.matched_via_overflow}")
-    print(f"Still missing in ClickHouse: {missing_total}")
-    print(f"Still extra in ClickHouse: {extra_total}")
-    print(f"Elapsed: {elapsed_td} ({elapsed:.3f}s)")
-    print("Done.")
+    # --- Final summaries / details, one set per pair ---
+    multi = len(args.pairs) > 1
+    pair_summaries = [report_pair(st.client, args, st, start_dt, multi) for st in states]
 
-    # Summary as a single JSON object
-    if args.summary:
+    if multi and args.summary:
+        elapsed = time.perf_counter() - t0
+        print(f"\n===== {len(states)} topic/table pairs validated in {elapsed:.3f}s =====")
         with open(args.summary, "w") as f:
             json.dump({
-                "kafka_messages_consumed": state.total_kafka,
-                "clickhouse_rows_scanned": state.total_ch_window,
-                "total_matched": matched_total,
-                "total_mismatched": mismatch_total,
-                "matched_direct": state.matched_direct,
-                "matched_via_overflow": state.matched_via_overflow,
-                "still_missing_in_clickhouse": missing_total,
-                "still_extra_in_clickhouse": extra_total,
+                "pairs": pair_summaries + skipped,
                 "elapsed_seconds": round(elapsed, 3),
             }, f, indent=2)
 
-    # Details as JSON array (was JSONL)
-    if args.details:
-        # limit samples like before
-        out = []
-        def add_samples(counter: Counter, title: str, limit: int = 100):
-            written = 0
-            for key, cnt in counter.items():
-                out.append({"title": title, "record": key, "count": cnt})
-                written += 1
-                if written >= limit:
-                    break
-        add_samples(state.missing_in_ch, "Missing in ClickHouse")
-        add_samples(state.pending_ch, "Extra in ClickHouse (unmatched)")
-        with open(args.details, "w") as f:
-            json.dump(out, f, indent=2)
-
-    # Bad rows + CH query windows as JSON arrays (was JSONL)
-    if args.bad_rows:
-        with open(args.bad_rows, "w") as f:
-            json.dump(state.bad_rows_list, f, indent=2)
-
-    if args.ch_query_log:
-        with open(args.ch_query_log, "w") as f:
-            json.dump(state.ch_query_windows_list, f, indent=2)
-
     print("Done.")
+    # False when any pair's repair failed, so schedulers see the run as failed
+    return not any(p["repair"] and "error" in p["repair"] for p in pair_summaries)
 
 # ---------- CLI ----------
 
 def main():
     ap = argparse.ArgumentParser(description="Batched Kafka ↔ ClickHouse validator with JSON outputs.")
     ap.add_argument("--broker", required=True)
-    ap.add_argument("--topic", required=True)
+    ap.add_argument("--topic", default=None)
+    ap.add_argument("--topic-table-map", default=None,
+                    help="Validate several pairs in one run, e.g. 'topic1=table1,topic2=table2' "
+                         "(same syntax as the sink's topic2TableMap); replaces --topic/--table")
     ap.add_argument("--group", default="validator_group")
     ap.add_argument("--start-time", required=True,
                     help=f"Start time as epoch ms OR UTC datetime in '{DATETIME_FMT}'")
     ap.add_argument("--batch-size", type=int, default=10000)
     ap.add_argument("--commit", action="store_true")
+    ap.add_argument("--payload-format", choices=PAYLOAD_FORMATS, default="json",
+                    help="Kafka value encoding: json, msgpack (array or map) or avro")
+    ap.add_argument("--avro-schema", default=None,
+                    help="Avro record schema (.avsc) for schemaless Avro bodies")
+    ap.add_argument("--schema-dir", default=None,
+                    help="Local schema registry stand-in: directory of <schema_id>.avsc files "
+                         "for registry-framed Avro (magic byte + 4-byte id)")
 
     ap.add_argument("--ch-host", required=True)
     ap.add_argument("--ch-port", type=int, default=9000)
     ap.add_argument("--ch-user", default="default")
     ap.add_argument("--ch-password", default="")
     ap.add_argument("--ch-database", required=True)
-    ap.add_argument("--table", required=True)
+    ap.add_argument("--table", default=None)
 
-    # outputs (now *.json)
+    # outputs (now *.json); with several pairs each file gets a ".<topic>" suffix
+    # and --summary additionally holds the combined summary of all pairs
     ap.add_argument("--summary", default="validation_summary.json")
     ap.add_argument("--details", default="validation_details.json",
                     help="JSON array of sampled mismatch records")
@@ -552,13 +852,46 @@ def main():
                     help="JSON array of malformed/missing-datetime rows")
     ap.add_argument("--ch-query-log", default="ch_query_windows.json",
                     help="JSON array of each ClickHouse query window and row_count")
+
+    # repair: backfill rows missing in ClickHouse
+    ap.add_argument("--repair", action="store_true",
+                    help="Insert every row counted as missing in ClickHouse into --table")
+    ap.add_argument("--repair-block-size", type=int, default=200000,
+                    help="Max rows per columnar INSERT block")
+    ap.add_argument("--repair-partition", choices=("auto", "day", "month", "none"), default="auto",
+                    help="Group repair blocks by UTC day/month of 'datetime'; 'auto' reads the "
+                         "table's partition_key from system.tables")
+    ap.add_argument("--repair-retries", type=int, default=3,
+                    help="Retries per block; retries reuse the block's insert_deduplication_token")
+    ap.add_argument("--repair-log", default="repair_blocks.json",
+                    help="JSON array of each repair insert block")
     args = ap.parse_args()
 
+    if args.repair_block_size < 1:
+        ap.error("--repair-block-size must be >= 1")
+    if args.repair_retries < 0:
+        ap.error("--repair-retries must be >= 0")
+
+    if args.topic_table_map:
+        if args.topic or args.table:
+            ap.error("use either --topic-table-map or --topic/--table, not both")
+        try:
+            args.pairs = parse_topic_table_map(args.topic_table_map)
+        except ValueError as e:
+            ap.error(str(e))
+    elif args.topic and args.table:
+        args.pairs = {args.topic: args.table}
+    else:
+        ap.error("--topic and --table (or --topic-table-map) are required")
+
     try:
-        run_validation(args)
+        ok = run_validation(args)
     except KeyboardInterrupt:
         print("Interrupted.", file=sys.stderr)
         sys.exit(130)
+    if not ok:
+        print("Repair failed for at least one topic/table pair.", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()